@@ -9,24 +9,14 @@ This module contains functions to retrieve a gspread worksheet as a
 using a `pandas.DataFrame`. To use these functions, have
 Pandas 0.14.0 or greater installed.
 """
-from gspread.utils import fill_gaps
-from gspread import Cell
+from gspread.utils import fill_gaps, rowcol_to_a1
 import pandas as pd
 import numpy as np
 from pandas.io.parsers import TextParser
 import logging
+import json
 import re
 from numbers import Real
-from six import string_types, ensure_text
-
-try:
-    from collections.abc import defaultdict
-except ImportError:
-    from collections import defaultdict
-try:
-    from itertools import chain, zip_longest
-except ImportError:
-    from itertools import chain, izip_longest as zip_longest
 
 logger = logging.getLogger(__name__)
 
@@ -34,27 +24,44 @@ __all__ = ("set_with_dataframe", "get_as_dataframe")
 
 WORKSHEET_MAX_CELL_COUNT = 10000000
 
+GOOGLE_SHEET_UPDATE_BYTES_LIMIT = 5000000
+
 UNNAMED_COLUMN_NAME_PATTERN = re.compile(r'^Unnamed:\s\d+(?:_level_\d+)?$')
 
+def _check_string_escaping(string_escaping):
+    """
+    Raise ValueError unless string_escaping is a valid value of the
+    string_escaping parameter (see `set_with_dataframe`).
+    """
+    if string_escaping not in ("default", "off", "full") and not callable(
+        string_escaping
+    ):
+        raise ValueError(
+            "string_escaping parameter must be one of: "
+            "'default', 'off', 'full', any callable taking one parameter"
+        )
+
+
 def _escaped_string(value, string_escaping):
     if value in (None, ""):
         return ""
+    _check_string_escaping(string_escaping)
+    return "'%s" % value if _escapes(value, string_escaping) else value
+
+
+def _escapes(value, string_escaping):
+    """
+    Whether a non-empty string value must be escaped as a text literal:
+    the one-value form of `_escape_mask`, for a string_escaping parameter
+    already checked with `_check_string_escaping`.
+    """
     if string_escaping == "default":
-        if value.startswith("'"):
-            return "'%s" % value
+        return value.startswith("'")
     elif string_escaping == "off":
-        return value
+        return False
     elif string_escaping == "full":
-        return "'%s" % value
-    elif callable(string_escaping):
-        if string_escaping(value):
-            return "'%s" % value
-    else:
-        raise ValueError(
-            "string_escaping parameter must be one of: "
-            "'default', 'off', 'full', any callable taking one parameter"
-        )
-    return value
+        return True
+    return bool(string_escaping(value))
 
 
 def _cellrepr(value, allow_formulas, string_escaping):
@@ -66,19 +73,228 @@ def _cellrepr(value, allow_formulas, string_escaping):
             to be interpreted as formulas; otherwise, escape
             them with an apostrophe to avoid formula interpretation.
     """
-    if pd.isnull(value) is True:
+    _check_string_escaping(string_escaping)
+    # plain Python numbers and strings are by far the most common
+    # values; handle them by exact type before dispatching through
+    # pandas' null checks and the Real ABC.
+    if value is None:
         return ""
-    if isinstance(value, Real):
+    value_type = type(value)
+    if value_type is float:
+        return "" if value != value else value
+    if value_type is int:
         return value
-    if not isinstance(value, string_types):
+    if value_type is not str:
+        if pd.isnull(value) is True:
+            return ""
+        if isinstance(value, Real):
+            return value
         value = str(value)
 
-    value = ensure_text(value, encoding='utf-8')
-
+    if value == "":
+        return value
     if (not allow_formulas) and value.startswith("="):
         return "'%s" % value
-    else:
-        return _escaped_string(value, string_escaping)
+    return "'%s" % value if _escapes(value, string_escaping) else value
+
+
+_REAL_TYPES = (int, float)
+# the concrete type test avoids the slower ABC instance check for the
+# common case of plain Python numbers.
+_isinstance_real = np.frompyfunc(
+    lambda value: type(value) in _REAL_TYPES or isinstance(value, Real), 1, 1
+)
+_to_text = np.frompyfunc(str, 1, 1)
+
+
+def _escape_mask(strings, first_chars, string_escaping):
+    """
+    Determine which of an array of string values must be escaped as text
+    literals, per the string_escaping parameter, which must already have
+    been checked with `_check_string_escaping`. Empty strings are never
+    escaped. See `_escapes` for the same rules applied to one value.
+    """
+    if string_escaping == "default":
+        return first_chars == "'"
+    elif string_escaping == "off":
+        return np.zeros(strings.shape, dtype=bool)
+    # the one-character view can't tell empty strings apart from
+    # strings starting with "\x00", so compare the strings themselves.
+    nonempty = strings != ""
+    if string_escaping == "full":
+        return nonempty
+    mask = np.zeros(strings.shape, dtype=bool)
+    mask[nonempty] = np.frompyfunc(
+        lambda value: bool(string_escaping(value)), 1, 1
+    )(strings[nonempty]).astype(bool)
+    return mask
+
+
+def _cellrepr_array(values, allow_formulas, string_escaping):
+    """
+    Get representations of an array of dataframe values (see `_cellrepr`).
+    The null, type and escaping checks are applied to the whole array at
+    once.
+
+    :param :values: numpy object array of values to represent.
+    :param :allow_formulas: see `_cellrepr`.
+    :param :string_escaping: see `set_with_dataframe`; must already have
+            been checked with `_check_string_escaping`.
+    :returns: numpy object array of the same shape as `values`.
+    """
+    flat = values.ravel()
+    out = flat.copy()
+    if not flat.size:
+        return out.reshape(values.shape)
+    null = pd.isna(flat)
+    text = ~null
+    text[text] = ~_isinstance_real(flat[text]).astype(bool)
+    if text.any():
+        out[text] = _escaped_strings(
+            _to_text(flat[text]).astype(object), allow_formulas, string_escaping
+        )
+    out[null] = ""
+    return out.reshape(values.shape)
+
+
+def _escaped_strings(strings, allow_formulas, string_escaping):
+    """
+    Apply the escaping done by `_cellrepr_array` to a 1-D object array of
+    strings.
+    The array is modified in place and returned.
+    """
+    # only the first character decides escaping; casting to a
+    # one-character unicode array keeps the comparison vectorized
+    # without copying whole strings into a fixed-width array.
+    first_chars = strings.astype("U1")
+    quote = _escape_mask(strings, first_chars, string_escaping)
+    if not allow_formulas:
+        quote |= first_chars == "="
+    strings[quote] = np.add("'", strings[quote])
+    return strings
+
+
+def _string_cellreprs(values, allow_formulas, string_escaping):
+    """
+    Get representations of a 1-D object array holding only strings and
+    nulls, such as a column of pandas' string dtype. Unlike
+    `_cellrepr_array`, no per-value type check or str() call is needed.
+    """
+    out = values.copy()
+    null = pd.isna(values)
+    if not null.all():
+        out[~null] = _escaped_strings(
+            values[~null], allow_formulas, string_escaping
+        )
+    out[null] = ""
+    return out
+
+
+def _numeric_cellreprs(values):
+    """
+    Get representations of an array of a numeric numpy dtype: the values
+    themselves, as native Python numbers, with NaN represented as "".
+    """
+    out = values.astype(object)
+    if values.dtype.kind == "f":
+        out[np.isnan(values)] = ""
+    return out
+
+
+def _categorical_cellreprs(values, allow_formulas, string_escaping):
+    """
+    Get representations of a Categorical. Each category is represented
+    once, and the result is taken from those by category code.
+    """
+    categories = _cellrepr_array(
+        values.categories.to_numpy('object'), allow_formulas, string_escaping
+    )
+    # missing values have code -1, which takes the trailing ""
+    return np.append(categories, "")[values.codes]
+
+
+def _filled(out, values):
+    """
+    Returns `values`, or `out` with `values` copied into it if given.
+    """
+    if out is None:
+        return values
+    out[...] = values
+    return out
+
+
+def _is_numeric_dtype(dtype):
+    return isinstance(dtype, np.dtype) and dtype.kind in "iufb"
+
+
+def _is_string_dtype(dtype):
+    # pandas' StringDtype is named "string"; pandas 3 adds a "str" dtype
+    return getattr(dtype, "name", None) in ("string", "str")
+
+
+def _is_categorical_dtype(dtype):
+    return isinstance(dtype, pd.CategoricalDtype)
+
+
+def _dataframe_cellreprs(dataframe, allow_formulas, string_escaping, out=None):
+    """
+    Get representations of all values in a DataFrame, as a 2-D object array.
+
+    Representation is dispatched once per column by dtype: columns of
+    integer, float or boolean numpy dtypes are represented by
+    `_numeric_cellreprs`, columns of pandas' string dtype by
+    `_string_cellreprs`, categorical columns by `_categorical_cellreprs`,
+    and all other columns go through `_cellrepr_array`. When every column
+    has the same numeric dtype, the whole frame is converted in one step.
+
+    If `out`, a 2-D object array of the DataFrame's shape, is given, the
+    representations are written into it, and it is returned.
+    """
+    dtypes = list(dataframe.dtypes)
+    if dtypes and len(set(dtypes)) == 1 and _is_numeric_dtype(dtypes[0]):
+        return _filled(out, _numeric_cellreprs(dataframe.to_numpy()))
+    others = [
+        i for i, dtype in enumerate(dtypes)
+        if not (
+            _is_numeric_dtype(dtype)
+            or _is_string_dtype(dtype)
+            or _is_categorical_dtype(dtype)
+        )
+    ]
+    if len(others) == len(dtypes):
+        # no copy needed here: _cellrepr_array never modifies its input.
+        return _filled(
+            out,
+            _cellrepr_array(
+                dataframe.to_numpy('object', copy=False),
+                allow_formulas,
+                string_escaping,
+            ),
+        )
+    if out is None:
+        out = np.empty(dataframe.shape, dtype=object)
+    for i, dtype in enumerate(dtypes):
+        if _is_numeric_dtype(dtype):
+            out[:, i] = _numeric_cellreprs(dataframe.iloc[:, i].to_numpy())
+        elif _is_string_dtype(dtype):
+            out[:, i] = _string_cellreprs(
+                dataframe.iloc[:, i].to_numpy('object'), allow_formulas, string_escaping
+            )
+        elif _is_categorical_dtype(dtype):
+            out[:, i] = _categorical_cellreprs(
+                dataframe.iloc[:, i].array, allow_formulas, string_escaping
+            )
+    if others:
+        # stack the remaining columns' own arrays rather than taking a
+        # sub-DataFrame with iloc, which would copy them one extra time.
+        out[:, others] = _cellrepr_array(
+            np.column_stack(
+                [dataframe.iloc[:, i].to_numpy('object') for i in others]
+            ),
+            allow_formulas,
+            string_escaping,
+        )
+    return out
 
 
 def _resize_to_minimum(worksheet, rows=None, cols=None):
@@ -157,26 +373,10 @@ def _get_all_values(worksheet, evaluate_formulas):
         cols=last_column - column_offset + 1,
     )
 
-    cells = [
-        Cell(row=i + row_offset, col=j + column_offset, value=value)
-        for i, row in enumerate(rect_values)
-        for j, value in enumerate(row)
-    ]
-
-    # defaultdicts fill in gaps for empty rows/cells not returned by gdocs
-    rows = defaultdict(lambda: defaultdict(str))
-    for cell in cells:
-        row = rows.setdefault(int(cell.row), defaultdict(str))
-        row[cell.col] = cell.value
-
-    if not rows:
+    # fill_gaps has already made the values rectangular, padding with "".
+    if not any(rect_values):
         return []
-
-    all_row_keys = chain.from_iterable(row.keys() for row in rows.values())
-    rect_cols = range(1, max(all_row_keys) + 1)
-    rect_rows = range(1, max(rows.keys()) + 1)
-
-    return [[rows[i][j] for j in rect_cols] for i in rect_rows]
+    return rect_values
 
 
 def get_as_dataframe(worksheet, evaluate_formulas=False, drop_empty_rows=True, drop_empty_columns=True, **options):
@@ -257,6 +457,16 @@ def _find_labels_of_empty_unnamed_columns(df):
         if _label_represents_unnamed_column(label) and df[label].isna().all() 
     ]
 
+def _index_values(index):
+    """
+    Returns the index's values as a 2-D object array, one column per level.
+    """
+    if isinstance(index, pd.MultiIndex):
+        return np.column_stack(
+            [index.get_level_values(i).to_numpy('object') for i in range(index.nlevels)]
+        )
+    return index.to_numpy('object').reshape(-1, 1)
+
 def _determine_level_count(index):
     if hasattr(index, "levshape"):
         return len(index.levshape)
@@ -321,6 +531,11 @@ def set_with_dataframe(
             The escaping done when allow_formulas=False (escaping string values
             beginning with `=`) is unaffected by this parameter's value.
             Default value is `'default'`.
+
+    Large DataFrames are written with several values update requests, one
+    per band of rows, sent in order. The write is not atomic: if a request
+    fails, the bands before it have already been written and the bands
+    after it are not.
     """
     # x_pos, y_pos refers to the position of data rows only,
     # excluding any header rows in the google sheet.
@@ -329,6 +544,8 @@ def set_with_dataframe(
     y, x = dataframe.shape
     index_col_size = 0
     column_header_size = 0
+    # reject a bad string_escaping value before the worksheet is resized.
+    _check_string_escaping(string_escaping)
     index_names = _index_names(dataframe.index)
     column_names_not_labels = _index_names(dataframe.columns)
     if include_index:
@@ -349,97 +566,135 @@ def set_with_dataframe(
     else:
         _resize_to_minimum(worksheet, y, x)
 
-    updates = []
+    header_rows = []
 
     if include_column_header:
-        elts = list(dataframe.columns)
         # if columns object is multi-index, it will span multiple rows
         extra_header_row = None
         if column_header_size > 1:
-            elts = list(dataframe.columns)
+            # one row per column (index columns first), one column per level
+            header_values = _index_values(dataframe.columns)
             if include_index:
-                extra = tuple(column_names_not_labels) \
-                        if column_names_not_labels \
-                        else ("",) * column_header_size
-                extra = [ extra ]
-                if index_col_size > 1:
-                    extra = extra + [ ("",) * column_header_size ] * (index_col_size - 1)
-                elts = extra + elts
+                extra = np.full(
+                    (index_col_size, column_header_size), "", dtype=object
+                )
+                if column_names_not_labels:
+                    extra[0] = column_names_not_labels
+                header_values = np.concatenate([extra, header_values])
                 # if index has names, they need their own header row
                 if index_names:
-                    extra_header_row = list(index_names) + [ "" ] * len(dataframe.columns)
-            for level in range(0, column_header_size):
-                for idx, tup in enumerate(elts):
-                    updates.append(
-                        (
-                            row,
-                            col + idx,
-                            _cellrepr(
-                                tup[level], allow_formulas, string_escaping
-                            ),
-                        )
-                    )
-                row += 1
-            if extra_header_row:
-                for idx, val in enumerate(extra_header_row):
-                    updates.append(
-                        (
-                            row,
-                            col + idx,
-                            _cellrepr(
-                                val, allow_formulas, string_escaping
-                            ),
-                        )
+                    extra_header_row = np.full(
+                        index_col_size + len(dataframe.columns), "", dtype=object
                     )
-                row += 1
+                    for i, name in enumerate(index_names):
+                        extra_header_row[i] = name
+            # transposed, each level of the header becomes one row
+            header_rows.extend(
+                _cellrepr_array(
+                    header_values.T, allow_formulas, string_escaping
+                ).tolist()
+            )
+            if extra_header_row is not None:
+                header_rows.append(
+                    _cellrepr_array(
+                        extra_header_row, allow_formulas, string_escaping
+                    ).tolist()
+                )
 
         else:
             # columns object is not multi-index, columns object's "names"
             # can not be written anywhere in header and be parseable to pandas.
-            elts = list(dataframe.columns)
+            elts = dataframe.columns.to_numpy('object')
             if include_index:
                 # if index has names, they do NOT need their own header row
-                if index_names:
-                    elts = index_names + elts
-                else:
-                    elts = ([""] * index_col_size) + elts
-            for idx, val in enumerate(elts):
-                updates.append(
-                    (
-                        row,
-                        col + idx,
-                        _cellrepr(val, allow_formulas, string_escaping),
-                    )
-                )
-            row += 1
-
-    values = []
-    for value_row, index_value in zip_longest(
-        dataframe.to_numpy('object'), dataframe.index.to_numpy('object')
-    ):
-        if include_index:
-            if not isinstance(index_value, (list, tuple)):
-                index_value = [index_value]
-            value_row = list(index_value) + list(value_row)
-        values.append(value_row)
-    for y_idx, value_row in enumerate(values):
-        for x_idx, cell_value in enumerate(value_row):
-            updates.append(
-                (
-                    y_idx + row,
-                    x_idx + col,
-                    _cellrepr(cell_value, allow_formulas, string_escaping),
-                )
+                index_elts = np.full(index_col_size, "", dtype=object)
+                for i, name in enumerate(index_names):
+                    index_elts[i] = name
+                elts = np.concatenate([index_elts, elts])
+            header_rows.append(
+                _cellrepr_array(elts, allow_formulas, string_escaping).tolist()
             )
 
-    if not updates:
+    if include_index:
+        # fill index and data columns into one preallocated array, so the
+        # data columns are not copied again to join them.
+        values = np.empty(
+            (len(dataframe), index_col_size + len(dataframe.columns)), dtype=object
+        )
+        values[:, :index_col_size] = _cellrepr_array(
+            _index_values(dataframe.index), allow_formulas, string_escaping
+        )
+        _dataframe_cellreprs(
+            dataframe, allow_formulas, string_escaping, out=values[:, index_col_size:]
+        )
+    else:
+        values = _dataframe_cellreprs(dataframe, allow_formulas, string_escaping)
+
+    # header and data rows together form one rectangle anchored at
+    # (row, col), which is sent as values updates of bands of its rows.
+    height, width = (len(header_rows) + len(values), values.shape[1])
+
+    if not height or not width:
         logger.debug("No updates to perform on worksheet.")
         return
 
-    cells_to_update = [Cell(row, col, value) for row, col, value in updates]
-    logger.debug("%d cell updates to send", len(cells_to_update))
+    logger.debug("%d cell updates to send", height * width)
+
+    _update_values_in_batches(worksheet, header_rows, values, row, col)
+
+
+def _estimated_row_bytes(rows, height, samples=100):
+    """
+    Estimates the JSON size of a row of the grid as the largest size among
+    up to `samples` rows spread evenly over it.
+    """
+    step = max(1, height // samples)
+    return max(
+        len(json.dumps(rows(i, i + 1)[0], default=str))
+        for i in range(0, height, step)
+    )
+
 
-    resp = worksheet.update_cells(
-        cells_to_update, value_input_option="USER_ENTERED"
+def _update_values_in_batches(worksheet, header_rows, values, row, col):
+    """
+    Sends a rectangle of cell values, made of the header rows (lists)
+    followed by the rows of the 2-D values array, whose upper-left corner
+    is at (row, col), as values updates of bands of whole rows, each of
+    an estimated GOOGLE_SHEET_UPDATE_BYTES_LIMIT bytes of JSON at most (or
+    a single row, if the rectangle is larger than that). Bands are sent
+    one after another, top to bottom; if one fails, no later band is sent.
+    """
+    head = len(header_rows)
+    height, width = (head + len(values), values.shape[1])
+
+    def rows(start, stop):
+        # data rows become lists only one band at a time, so the whole
+        # rectangle never exists as lists of Python values at once.
+        return header_rows[start:stop] + values[
+            max(start - head, 0):max(stop - head, 0)
+        ].tolist()
+
+    band_size = max(
+        1, GOOGLE_SHEET_UPDATE_BYTES_LIMIT // _estimated_row_bytes(rows, height)
     )
-    logger.debug("Cell update response: %s", resp)
+    title = _quote_worksheet_title(worksheet.title)
+
+    def update(start):
+        band = rows(start, start + band_size)
+        range_name = "%s!%s:%s" % (
+            title,
+            rowcol_to_a1(row + start, col),
+            rowcol_to_a1(row + start + len(band) - 1, col + width - 1),
+        )
+        resp = worksheet.spreadsheet.values_update(
+            range_name,
+            params={"valueInputOption": "USER_ENTERED"},
+            body={"values": band},
+        )
+        logger.debug("Cell update response: %s", resp)
+        return resp
+
+    starts = range(0, height, band_size)
+    if len(starts) > 1:
+        logger.debug("Sending %d cell update batches", len(starts))
+    return [update(start) for start in starts]
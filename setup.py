@@ -4,32 +4,24 @@ except ImportError:
     from distutils.core import setup
 
 import os.path
-import sys
-
-PY3 = sys.version_info >= (3, 0)
 
 with open(os.path.join(os.path.dirname(__file__), 'VERSION'), 'rb') as f:
-    VERSION = f.read()
-    if PY3:
-        VERSION = VERSION.decode('utf8')
-    VERSION = VERSION.strip()
+    VERSION = f.read().decode('utf8').strip()
 
 with open(os.path.join(os.path.dirname(__file__), 'README.rst'), 'rb') as f:
-    long_description = f.read()
-    if PY3:
-        long_description = long_description.decode('utf8')
+    long_description = f.read().decode('utf8')
 
 setup(
     name='gspread-dataframe',
     version=VERSION,
     py_modules=['gspread_dataframe'],
     test_suite='tests',
+    python_requires='>=3',
     install_requires=[
         'gspread>=3.0.0', 
-        'pandas>=0.24.0',
-        'six>=1.12.0'
+        'pandas>=0.24.0'
         ],
-    tests_require=['oauth2client'] + ([] if PY3 else ['mock']),
+    tests_require=['oauth2client'],
     description='Read/write gspread worksheets using pandas DataFrames',
     long_description=long_description,
     author='Robin Thomas',
@@ -9,30 +9,19 @@ import uuid
 import json
 import logging
 import sys
-from random import uniform
+import configparser
 from datetime import datetime, date
 from gspread.exceptions import APIError
+import numpy as np
 import pandas as pd
 from gspread_dataframe import \
     get_as_dataframe, \
     set_with_dataframe, \
     _resize_to_minimum
 
-try:
-    import ConfigParser
-except ImportError:
-    import configparser as ConfigParser
-
-from oauth2client.service_account import ServiceAccountCredentials
-
 import gspread
 from gspread import utils
 
-try:
-    unicode
-except NameError:
-    basestring = unicode = str
-
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
@@ -43,7 +32,7 @@ SCOPE = [
     "https://www.googleapis.com/auth/drive.file",
 ]
 
-I18N_STR = u"Iñtërnâtiônàlizætiøn"  # .encode('utf8')
+I18N_STR = "Iñtërnâtiônàlizætiøn"  # .encode('utf8')
 
 CELL_LIST_FILENAME = os.path.join(os.path.dirname(__file__), "cell_list.json")
 
@@ -51,26 +40,40 @@ STRING_ESCAPING_PATTERN = re.compile(r"(?:'\+|3e50)").match
 
 TEST_WORKSHEET_NAME = "ZZZ1"  # just happens to be a valid cell reference (column ZZZ, row 1)
 
+TEST_WORKSHEET_GRID = {"rowCount": 200, "columnCount": 20}
+
 def read_config(filename):
-    config = ConfigParser.ConfigParser()
+    config = configparser.ConfigParser()
     with open(filename) as fp:
-        if hasattr(config, "read_file"):
-            read_func = config.read_file
-        else:
-            read_func = config.readfp
-        read_func(fp)
+        config.read_file(fp)
     return config
 
 
 def read_credentials(filename):
+    # imported here: only needed once credentials are actually read
+    from oauth2client.service_account import ServiceAccountCredentials
+
     return ServiceAccountCredentials.from_json_keyfile_name(filename, SCOPE)
 
 
 def gen_value(prefix=None):
     if prefix:
-        return u"%s %s" % (prefix, gen_value())
+        return "%s %s" % (prefix, gen_value())
     else:
-        return unicode(uuid.uuid4())
+        return str(uuid.uuid4())
+
+
+def refresh_grid_properties(sheet):
+    """
+    Updates the worksheet's row and column counts in place, fetching only
+    the sheets' grid properties rather than all spreadsheet metadata.
+    """
+    metadata = sheet.spreadsheet.fetch_sheet_metadata(
+        params={"fields": "sheets(properties(sheetId,gridProperties))"}
+    )
+    for properties in (s["properties"] for s in metadata["sheets"]):
+        if properties["sheetId"] == sheet.id:
+            sheet._properties["gridProperties"] = properties["gridProperties"]
 
 
 class GspreadDataframeTest(unittest.TestCase):
@@ -88,8 +91,6 @@ class GspreadDataframeTest(unittest.TestCase):
             raise Exception(msg % e.filename)
 
     def setUp(self):
-        if self.__class__.gc is None:
-            self.__class__.setUpClass()
         self.assertTrue(isinstance(self.gc, gspread.client.Client))
 
 
@@ -97,24 +98,13 @@ class WorksheetTest(GspreadDataframeTest):
     """Test for gspread_dataframe using a gspread.Worksheet."""
 
     spreadsheet = None
+    locale = None
 
     @classmethod
     def setUpClass(cls):
         super(WorksheetTest, cls).setUpClass()
         ss_id = cls.config.get("Spreadsheet", "id")
         cls.spreadsheet = cls.gc.open_by_key(ss_id)
-        cls.spreadsheet.batch_update(
-            {
-                "requests": [
-                    {
-                        "updateSpreadsheetProperties": {
-                            "properties": {"locale": "en_US"},
-                            "fields": "locale",
-                        }
-                    }
-                ]
-            }
-        )
         try:
             test_sheet = cls.spreadsheet.worksheet(TEST_WORKSHEET_NAME)
             if test_sheet:
@@ -122,42 +112,97 @@ class WorksheetTest(GspreadDataframeTest):
                 cls.spreadsheet.del_worksheet(test_sheet)
         except gspread.exceptions.WorksheetNotFound:
             pass  # expected
-
-    def setUp(self):
-        super(WorksheetTest, self).setUp()
-        self.streamHandler = logger.addHandler(logging.StreamHandler(sys.stdout))
-        if self.__class__.spreadsheet is None:
-            self.__class__.setUpClass()
-        self.sheet = self.spreadsheet.add_worksheet(TEST_WORKSHEET_NAME, 200, 20)
-        self.__class__.spreadsheet.batch_update(
+        # one worksheet is shared by all tests; add it and set the locale
+        # in one request
+        cls.spreadsheet.batch_update(
             {
                 "requests": [
+                    {
+                        "addSheet": {
+                            "properties": {
+                                "title": TEST_WORKSHEET_NAME,
+                                "sheetType": "GRID",
+                                "gridProperties": dict(TEST_WORKSHEET_GRID),
+                            }
+                        }
+                    },
                     {
                         "updateSpreadsheetProperties": {
                             "properties": {"locale": "en_US"},
                             "fields": "locale",
                         }
-                    }
+                    },
                 ]
             }
         )
+        cls.sheet = cls.spreadsheet.worksheet(TEST_WORKSHEET_NAME)
+        cls.locale = "en_US"
+        # cell list values, shared by tests and never modified by them
+        with open(CELL_LIST_FILENAME) as f:
+            # drop empty column and empty row
+            cls.rows = [r[:-1] for r in json.load(f)][:-1]
+        cls.row_index_tuples = list(
+            pd.MultiIndex.from_product(
+                [["A", "B"], ["one", "two", "three", "four", "five"]]
+            )
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.spreadsheet is not None:
+            cls.spreadsheet.del_worksheet(cls.sheet)
+
+    def setUp(self):
+        super(WorksheetTest, self).setUp()
+        self.streamHandler = logger.addHandler(logging.StreamHandler(sys.stdout))
 
     def tearDown(self):
-        self.spreadsheet.del_worksheet(self.sheet)
+        # restore the shared worksheet's size, clear its values and formats, and
+        # reset the locale if the test changed it, in one request
+        requests = [
+            {
+                "updateSheetProperties": {
+                    "properties": {
+                        "sheetId": self.sheet.id,
+                        "gridProperties": dict(TEST_WORKSHEET_GRID),
+                    },
+                    "fields": "gridProperties/rowCount,gridProperties/columnCount",
+                }
+            },
+            {
+                "updateCells": {
+                    "range": {"sheetId": self.sheet.id},
+                    "fields": "userEnteredValue,userEnteredFormat",
+                }
+            },
+        ]
+        if self.locale != "en_US":
+            requests.append(
+                {
+                    "updateSpreadsheetProperties": {
+                        "properties": {"locale": "en_US"},
+                        "fields": "locale",
+                    }
+                }
+            )
+            self.__class__.locale = "en_US"
+        self.spreadsheet.batch_update({"requests": requests})
+        self.sheet._properties["gridProperties"].update(TEST_WORKSHEET_GRID)
         logger.removeHandler(self.streamHandler)
 
+    def _populate(self, rows):
+        """Writes the rows of values to the worksheet, starting at A1."""
+        self.sheet.spreadsheet.values_update(
+            "'%s'!A1:%s" % (
+                self.sheet.title, utils.rowcol_to_a1(len(rows), len(rows[0]))
+            ),
+            params={"valueInputOption": "RAW"},
+            body={"values": rows},
+        )
+
     def test_roundtrip(self):
         # populate sheet with cell list values
-        rows = None
-        with open(CELL_LIST_FILENAME) as f:
-            rows = json.load(f)
-            # drop empty column, drop empty row
-            rows = [ r[:-1] for r in rows ][:-1]
-
-        cell_list = self.sheet.range("A1:J10")
-        for cell, value in zip(cell_list, itertools.chain(*rows)):
-            cell.value = value
-        self.sheet.update_cells(cell_list)
+        self._populate(self.rows)
 
         df = get_as_dataframe(self.sheet)
         set_with_dataframe(
@@ -180,17 +225,9 @@ class WorksheetTest(GspreadDataframeTest):
                 ]
             }
         )
+        self.__class__.locale = "es_ES"
         # populate sheet with cell list values
-        rows = None
-        with open(CELL_LIST_FILENAME) as f:
-            rows = json.load(f)
-            # drop empty column and empty row
-            rows = [ r[:-1] for r in rows ][:-1]
-
-        cell_list = self.sheet.range("A1:J10")
-        for cell, value in zip(cell_list, itertools.chain(*rows)):
-            cell.value = value
-        self.sheet.update_cells(cell_list)
+        self._populate(self.rows)
 
         df = get_as_dataframe(self.sheet)
         set_with_dataframe(
@@ -203,16 +240,7 @@ class WorksheetTest(GspreadDataframeTest):
 
     def test_nrows(self):
         # populate sheet with cell list values
-        rows = None
-        with open(CELL_LIST_FILENAME) as f:
-            rows = json.load(f)
-            # drop empty column and empty row
-            rows = [ r[:-1] for r in rows ][:-1]
-
-        cell_list = self.sheet.range("A1:J10")
-        for cell, value in zip(cell_list, itertools.chain(*rows)):
-            cell.value = value
-        self.sheet.update_cells(cell_list)
+        self._populate(self.rows)
 
         for nrows in (9, 6, 0):
             df = get_as_dataframe(self.sheet, nrows=nrows)
@@ -220,52 +248,50 @@ class WorksheetTest(GspreadDataframeTest):
 
     def test_resize_to_minimum_large(self):
         self.sheet.resize(100, 26)
-        self.sheet = self.sheet.spreadsheet.worksheet(self.sheet.title)
         # Large increase that requires exact re-sizing to avoid exceeding 
         # cell limit: this should result in 1000000 rows and 2 columns.
         # The sheets API, however, applies new rowCount first, then
         # checks against cell count limit before applying new colCount!
         # So to avoid a 400 response, we must in these cases have
-        # _resize_to_minimum call resize twice, first with the value
-        # that will reduce cell count and second with the value that
+        # _resize_to_minimum apply two changes in order, first the value
+        # that will reduce cell count and second the value that
         # will increase cell count.
         _resize_to_minimum(self.sheet, 1000000, 2)
-        self.sheet = self.sheet.spreadsheet.worksheet(self.sheet.title)
+        refresh_grid_properties(self.sheet)
         self.assertEqual(1000000, self.sheet.row_count)
         self.assertEqual(2, self.sheet.col_count)
         # let's test the other case, where if columnCount were applied
         # first the limit would be exceeded.
         _resize_to_minimum(self.sheet, 10000, 26)
-        self.sheet = self.sheet.spreadsheet.worksheet(self.sheet.title)
+        refresh_grid_properties(self.sheet)
         self.assertEqual(10000, self.sheet.row_count)
         self.assertEqual(26, self.sheet.col_count)
 
     def test_resize_to_minimum(self):
         self.sheet.resize(100, 26)
-        self.sheet = self.sheet.spreadsheet.worksheet(self.sheet.title)
         # min rows < current, no change
         _resize_to_minimum(self.sheet, 20, None)
-        self.sheet = self.sheet.spreadsheet.worksheet(self.sheet.title)
+        refresh_grid_properties(self.sheet)
         self.assertEqual(100, self.sheet.row_count)
         self.assertEqual(26, self.sheet.col_count)
         # min cols < current, no change
         _resize_to_minimum(self.sheet, None, 2)
-        self.sheet = self.sheet.spreadsheet.worksheet(self.sheet.title)
+        refresh_grid_properties(self.sheet)
         self.assertEqual(100, self.sheet.row_count)
         self.assertEqual(26, self.sheet.col_count)
         # increase rows
         _resize_to_minimum(self.sheet, 200, None)
-        self.sheet = self.sheet.spreadsheet.worksheet(self.sheet.title)
+        refresh_grid_properties(self.sheet)
         self.assertEqual(200, self.sheet.row_count)
         self.assertEqual(26, self.sheet.col_count)
         # increase cols
         _resize_to_minimum(self.sheet, None, 27)
-        self.sheet = self.sheet.spreadsheet.worksheet(self.sheet.title)
+        refresh_grid_properties(self.sheet)
         self.assertEqual(200, self.sheet.row_count)
         self.assertEqual(27, self.sheet.col_count)
         # increase both
         _resize_to_minimum(self.sheet, 201, 28)
-        self.sheet = self.sheet.spreadsheet.worksheet(self.sheet.title)
+        refresh_grid_properties(self.sheet)
         self.assertEqual(201, self.sheet.row_count)
         self.assertEqual(28, self.sheet.col_count)
         # large increase that exact re-sizing cannot keep below cell limit
@@ -275,25 +301,13 @@ class WorksheetTest(GspreadDataframeTest):
         
     def test_multiindex(self):
         # populate sheet with cell list values
-        rows = None
-        with open(CELL_LIST_FILENAME) as f:
-            rows = json.load(f)
-            # drop empty column and empty row
-            rows = [ r[:-1] for r in rows ][:-1]
-        mi = list(
-            pd.MultiIndex.from_product(
-                [["A", "B"], ["one", "two", "three", "four", "five"]]
-            )
-        )
+        rows = self.rows
+        mi = self.row_index_tuples
         column_names = ["Category", "Subcategory"] + rows[0]
         rows = [column_names] + [
             list(index_tup) + row for row, index_tup in zip(rows[1:], mi)
         ]
-        cell_list = self.sheet.range("A1:L10")
-        for cell, value in zip(cell_list, itertools.chain(*rows)):
-            cell.value = value
-        self.sheet.update_cells(cell_list)
-        self.sheet = self.sheet.spreadsheet.worksheet(self.sheet.title)
+        self._populate(rows)
         df = get_as_dataframe(self.sheet, index_col=[0, 1])
         set_with_dataframe(
             self.sheet,
@@ -303,17 +317,13 @@ class WorksheetTest(GspreadDataframeTest):
             string_escaping=STRING_ESCAPING_PATTERN,
         )
         # must do this to refresh the size attributes of worksheet
-        self.sheet = self.sheet.spreadsheet.worksheet(self.sheet.title)
+        refresh_grid_properties(self.sheet)
         df2 = get_as_dataframe(self.sheet, index_col=[0, 1])
         self.assertTrue(df.equals(df2))
 
     def test_multiindex_column_header(self):
         # populate sheet with cell list values
-        rows = None
-        with open(CELL_LIST_FILENAME) as f:
-            rows = json.load(f)
-            # drop empty column, drop empty row
-            rows = [ r[:-1] for r in rows ][:-1]
+        rows = self.rows
         column_headers = [
             "SQL",
             "SQL",
@@ -327,11 +337,7 @@ class WorksheetTest(GspreadDataframeTest):
             "Misc",
         ]
         rows = [column_headers] + rows
-        cell_list = self.sheet.range("A1:J11")
-        for cell, value in zip(cell_list, itertools.chain(*rows)):
-            cell.value = value
-        self.sheet.update_cells(cell_list)
-        self.sheet = self.sheet.spreadsheet.worksheet(self.sheet.title)
+        self._populate(rows)
         df = get_as_dataframe(self.sheet, header=[0, 1])
         self.assertEqual((2, 10), getattr(df.columns, "levshape", None)),
         set_with_dataframe(
@@ -356,50 +362,62 @@ class WorksheetTest(GspreadDataframeTest):
             resize=True,
             include_index=True
         )
-        self.sheet = self.sheet.spreadsheet.worksheet(self.sheet.title)
+        refresh_grid_properties(self.sheet)
         df2 = get_as_dataframe(self.sheet, dtype={'a': 'int64', 'b': 'int64'}, index_col=0, header=0)
         self.assertTrue(df.equals(df2))
 
     def test_header_writing_and_parsing(self):
         truth_table = itertools.product(*([[False, True]] * 4))
-        for include_index, columns_multilevel, index_has_names, columns_has_names in truth_table:
-            data = [[uniform(0, 100000) for i in range(8)] for j in range(20)]
-            index_names = ["Category", "Subcategory"] if index_has_names else None
-            index = list(
+        # values and labels are the same for every case; only which of
+        # them are written, and whether they are named, varies.
+        data = np.random.default_rng().uniform(0, 100000, size=(20, 8)).tolist()
+        base_index = pd.MultiIndex.from_tuples(
+            list(
                 itertools.product(
                     ["A", "B", "C", "D"],
                     ["one", "two", "three", "four", "five"],
                 )
             )
-            index = pd.MultiIndex.from_tuples(index, names=index_names)
-            if not include_index:
-                index = None
-            columns = ["Alice", "Bob", "Carol", "Dave", "Ellen", "Fulgencio", "Gina", "Hector"]
-            columns = [ ("Helpful" if i < 4 else "Unhelpful", v) for i, v in enumerate(columns) ]
-            names = ["Demeanor", "Name"] if columns_has_names else None
-            columns = pd.MultiIndex.from_tuples(columns, names=names)
-            if not columns_multilevel:
-                columns = columns.droplevel(0)
-            df = pd.DataFrame.from_records(data, index=index, columns=columns)
-            set_with_dataframe(self.sheet, df, resize=True, include_index=include_index)
-            self.sheet = self.sheet.spreadsheet.worksheet(self.sheet.title)
-            header_arg = list(range(len(getattr(columns, "levshape", [1]))))
-            # if include_index and columns_multilevel and index_has_names, there
-            # will be an additional header row
-            index_col_arg = list(range(len(getattr(index, "levshape", [1]))))
-            df_readback = get_as_dataframe(
-                self.sheet, 
-                header=header_arg,
-                index_col=(index_col_arg if include_index else None)
-            )
-            if not df.equals(df_readback):
-                logger.info(
-                    "Testing include_index %s, index_has_names %s, columns_multilevel %s, columns_has_names %s",
-                    include_index, index_has_names, columns_multilevel, columns_has_names
+        )
+        column_names = ["Alice", "Bob", "Carol", "Dave", "Ellen", "Fulgencio", "Gina", "Hector"]
+        base_columns = pd.MultiIndex.from_tuples(
+            [("Helpful" if i < 4 else "Unhelpful", v) for i, v in enumerate(column_names)]
+        )
+        for include_index, columns_multilevel, index_has_names, columns_has_names in truth_table:
+            with self.subTest(
+                include_index=include_index,
+                columns_multilevel=columns_multilevel,
+                index_has_names=index_has_names,
+                columns_has_names=columns_has_names,
+            ):
+                index_names = ["Category", "Subcategory"] if index_has_names else [None, None]
+                index = base_index.set_names(index_names)
+                if not include_index:
+                    index = None
+                names = ["Demeanor", "Name"] if columns_has_names else [None, None]
+                columns = base_columns.set_names(names)
+                if not columns_multilevel:
+                    columns = columns.droplevel(0)
+                df = pd.DataFrame.from_records(data, index=index, columns=columns)
+                set_with_dataframe(self.sheet, df, resize=True, include_index=include_index)
+                refresh_grid_properties(self.sheet)
+                header_arg = list(range(len(getattr(columns, "levshape", [1]))))
+                # if include_index and columns_multilevel and index_has_names, there
+                # will be an additional header row
+                index_col_arg = list(range(len(getattr(index, "levshape", [1]))))
+                df_readback = get_as_dataframe(
+                    self.sheet, 
+                    header=header_arg,
+                    index_col=(index_col_arg if include_index else None)
                 )
-                logger.info("header=%s, index_col=%s", header_arg, index_col_arg)
-                logger.info("%s", df)
-                logger.info("%s", df.dtypes)
-                logger.info("%s", df_readback)
-                logger.info("%s", df_readback.dtypes)
-            self.assertTrue(df.equals(df_readback))
+                if not df.equals(df_readback):
+                    logger.info(
+                        "Testing include_index %s, index_has_names %s, columns_multilevel %s, columns_has_names %s",
+                        include_index, index_has_names, columns_multilevel, columns_has_names
+                    )
+                    logger.info("header=%s, index_col=%s", header_arg, index_col_arg)
+                    logger.info("%s", df)
+                    logger.info("%s", df.dtypes)
+                    logger.info("%s", df_readback)
+                    logger.info("%s", df_readback.dtypes)
+                self.assertTrue(df.equals(df_readback))
@@ -1,24 +1,22 @@
 # -*- coding: utf-8 -*-
 from .mock_worksheet import (
     MockWorksheet,
-    CELL_LIST,
-    CELL_LIST_STRINGIFIED,
-    CELL_LIST_STRINGIFIED_NO_THINGY,
+    VALUES_STRINGIFIED,
+    VALUES_STRINGIFIED_NO_THINGY,
 )
 
 from gspread_dataframe import get_as_dataframe, set_with_dataframe
 from gspread_dataframe import _escaped_string as escape, _cellrepr as cellrepr
-from gspread import Cell
+from gspread_dataframe import _cellrepr_array as cellrepr_array
+from gspread_dataframe import _dataframe_cellreprs as cellreprs
+from gspread_dataframe import _get_all_values as get_all_values
+from gspread_dataframe import _resize_to_minimum as resize_to_minimum
 import numpy as np
 import pandas as pd
-from difflib import SequenceMatcher
 
 import unittest
 
-try:
-    from unittest.mock import Mock, MagicMock
-except ImportError:
-    from mock import Mock, MagicMock
+from unittest.mock import MagicMock, call, patch
 from datetime import datetime
 import re
 
@@ -100,13 +98,137 @@ class TestStringEscaping(unittest.TestCase):
             (),
         )
 
+    def test_leading_nul_is_not_empty(self):
+        self.assertEqual(escape("\x00a", "full"), "'\x00a")
+        self.assertEqual(escape("\x00", lambda x: True), "'\x00")
+
     def test_formula_cellrepr_when_no_formulas_allowed(self):
         self.assertEqual(cellrepr("=A1", allow_formulas=False, string_escaping="default"), "'=A1")
 
+    def test_cellrepr_array(self):
+        values = np.array(
+            self.CORE_VALUES
+            + self.VALUES_WITH_LEADING_APOSTROPHE
+            + self.VALUES_NEVER_ESCAPED
+            + (None, np.nan, pd.NaT, 0, -1, 2.5, True, [1, 2, 3], datetime(2017, 3, 4)),
+            dtype=object,
+        ).reshape(3, 6)
+        starts_with_digit = re.compile(r"^\d").match
+        cases = [
+            (True, "default", [
+                ["foo", '"""""', "2015-06-14", "345.60", "+", "=sum(a:a)"],
+                ["''foo", "''", "", "", "", ""],
+                [0, -1, 2.5, True, "[1, 2, 3]", "2017-03-04 00:00:00"],
+            ]),
+            (True, "off", [
+                ["foo", '"""""', "2015-06-14", "345.60", "+", "=sum(a:a)"],
+                ["'foo", "'", "", "", "", ""],
+                [0, -1, 2.5, True, "[1, 2, 3]", "2017-03-04 00:00:00"],
+            ]),
+            (True, "full", [
+                ["'foo", '\'"""""', "'2015-06-14", "'345.60", "'+", "'=sum(a:a)"],
+                ["''foo", "''", "", "", "", ""],
+                [0, -1, 2.5, True, "'[1, 2, 3]", "'2017-03-04 00:00:00"],
+            ]),
+            (True, starts_with_digit, [
+                ["foo", '"""""', "'2015-06-14", "'345.60", "+", "=sum(a:a)"],
+                ["'foo", "'", "", "", "", ""],
+                [0, -1, 2.5, True, "[1, 2, 3]", "'2017-03-04 00:00:00"],
+            ]),
+            (False, "default", [
+                ["foo", '"""""', "2015-06-14", "345.60", "+", "'=sum(a:a)"],
+                ["''foo", "''", "", "", "", ""],
+                [0, -1, 2.5, True, "[1, 2, 3]", "2017-03-04 00:00:00"],
+            ]),
+            (False, "off", [
+                ["foo", '"""""', "2015-06-14", "345.60", "+", "'=sum(a:a)"],
+                ["'foo", "'", "", "", "", ""],
+                [0, -1, 2.5, True, "[1, 2, 3]", "2017-03-04 00:00:00"],
+            ]),
+            (False, "full", [
+                ["'foo", '\'"""""', "'2015-06-14", "'345.60", "'+", "'=sum(a:a)"],
+                ["''foo", "''", "", "", "", ""],
+                [0, -1, 2.5, True, "'[1, 2, 3]", "'2017-03-04 00:00:00"],
+            ]),
+            (False, starts_with_digit, [
+                ["foo", '"""""', "'2015-06-14", "'345.60", "+", "'=sum(a:a)"],
+                ["'foo", "'", "", "", "", ""],
+                [0, -1, 2.5, True, "[1, 2, 3]", "'2017-03-04 00:00:00"],
+            ]),
+        ]
+        for allow_formulas, escape_arg, expected in cases:
+            actual = cellrepr_array(values, allow_formulas, escape_arg)
+            self.assertEqual(actual.shape, values.shape)
+            self.assertEqual(actual.tolist(), expected)
+            self.assertEqual(
+                [
+                    [cellrepr(v, allow_formulas, escape_arg) for v in row]
+                    for row in values
+                ],
+                expected,
+            )
+
+    def test_dataframe_cellreprs_numeric_columns(self):
+        df = pd.DataFrame(
+            {
+                "ints": np.array([1, 2, 3], dtype=np.int64),
+                "floats": [1.5, np.nan, -2.0],
+                "bools": [True, False, True],
+                "strings": ["'a", "=b", None],
+            }
+        )
+        actual = cellreprs(df, allow_formulas=False, string_escaping="default")
+        self.assertEqual(
+            actual.tolist(),
+            [
+                [1, 1.5, True, "''a"],
+                [2, "", False, "'=b"],
+                [3, -2.0, True, ""],
+            ],
+        )
+        self.assertEqual(
+            [type(v) for v in actual[0]], [int, float, bool, str]
+        )
+
+    def test_dataframe_cellreprs_all_numeric(self):
+        df = pd.DataFrame([[1.5, np.nan], [np.nan, 2.0]], columns=["a", "b"])
+        actual = cellreprs(df, allow_formulas=True, string_escaping="default")
+        self.assertEqual(actual.tolist(), [[1.5, ""], ["", 2.0]])
+
+    def test_dataframe_cellreprs_string_dtype(self):
+        df = pd.DataFrame(
+            {"s": pd.Series(["'a", "=b", None, ""], dtype="string")}
+        )
+        actual = cellreprs(df, allow_formulas=False, string_escaping="default")
+        self.assertEqual(actual.tolist(), [["''a"], ["'=b"], [""], [""]])
+
+    def test_dataframe_cellreprs_categorical(self):
+        df = pd.DataFrame(
+            {
+                "c": pd.Categorical(["'x", "y", None, "'x"]),
+                "n": [1, 2, 3, 4],
+            }
+        )
+        actual = cellreprs(df, allow_formulas=True, string_escaping="default")
+        self.assertEqual(
+            actual.tolist(), [["''x", 1], ["y", 2], ["", 3], ["''x", 4]]
+        )
+
+    def test_dataframe_cellreprs_into_out(self):
+        df = pd.DataFrame({"a": [1.5, np.nan], "b": ["'x", None]})
+        out = np.full((2, 3), "idx", dtype=object)
+        actual = cellreprs(
+            df, allow_formulas=True, string_escaping="default", out=out[:, 1:]
+        )
+        self.assertEqual(actual.tolist(), [[1.5, "''x"], ["", ""]])
+        self.assertEqual(out.tolist(), [["idx", 1.5, "''x"], ["idx", "", ""]])
+
 
 class TestWorksheetReads(unittest.TestCase):
-    def setUp(self):
-        self.sheet = MockWorksheet()
+    @classmethod
+    def setUpClass(cls):
+        # reads never modify the worksheet, so all tests can share one
+        cls.sheet = MockWorksheet()
 
     def test_noargs(self):
         df = get_as_dataframe(self.sheet)
@@ -218,66 +340,60 @@ class TestWorksheetReads(unittest.TestCase):
         df = get_as_dataframe(
             self.sheet,
             parse_dates=[4],
-            date_parser=lambda x: datetime.strptime(x, "%Y-%m-%d") if x is not np.nan else None
+            date_parser=lambda values: pd.to_datetime(values, format="%Y-%m-%d")
         )
         self.assertEqual(df["Date Column"][0], datetime(2017, 3, 4))
 
 
-_original_mock_failure_message = Mock._format_mock_failure_message
-
-
-def _format_mock_failure_message(self, args, kwargs):
-    message = "Expected call: %s\nActual call: %s"
-    expected_string = self._format_mock_call_signature(args, kwargs)
-    call_args = self.call_args
-    if len(call_args) == 3:
-        call_args = call_args[1:]
-    actual_string = self._format_mock_call_signature(*call_args)
-    msg = message % (expected_string, actual_string)
-    if (
-        len(call_args[0]) > 1
-        and isinstance(call_args[0][1], (str, bytes))
-        and len(args) > 1
-        and isinstance(args[1], (str, bytes))
-        and call_args[0][1] != args[1]
-    ):
-        import difflib
-
-        sm = difflib.SequenceMatcher(None, call_args[0][1], args[1])
-        m = sm.find_longest_match(0, len(call_args[0][1]), 0, len(args[1]))
-        msg += "; diff: at index %d, expected %s -- actual %s" % (
-            m.a + m.size,
-            call_args[0][1][m.a + m.size - 40 : m.a + m.size + 40],
-            args[1][m.b + m.size - 40 : m.b + m.size + 40],
+class TestGetAllValues(unittest.TestCase):
+    def setUp(self):
+        self.sheet = MagicMock(row_count=3, col_count=4, title="ragged")
+
+    def test_ragged_values_are_padded(self):
+        self.sheet.spreadsheet.values_get.return_value = {
+            "values": [["a", "b"], [], ["c", "d", "e"]]
+        }
+        self.assertEqual(
+            get_all_values(self.sheet, False),
+            [["a", "b", "", ""], ["", "", "", ""], ["c", "d", "e", ""]],
         )
-    return msg
 
+    def test_no_values(self):
+        self.sheet.spreadsheet.values_get.return_value = {}
+        self.assertEqual(get_all_values(self.sheet, False), [[""] * 4] * 3)
 
-Mock._format_mock_failure_message = _format_mock_failure_message
 
-# have to patch Cell to make cells comparable
-def __eq__(self, other):
-    if not isinstance(other, self.__class__):
-        return False
-    return (
-        self.row == other.row
-        and self.col == other.col
-        and self.value == other.value
-    )
+class TestResizeToMinimum(unittest.TestCase):
+    def setUp(self):
+        self.sheet = MockWorksheet()
+        self.sheet.row_count, self.sheet.col_count = (100, 26)
+        self.sheet.resize = MagicMock()
 
+    def test_increase_both(self):
+        resize_to_minimum(self.sheet, 200, 27)
+        self.sheet.resize.assert_called_once_with(200, 27)
 
-Cell.__eq__ = __eq__
+    def test_cols_first(self):
+        resize_to_minimum(self.sheet, 1000000, 2)
+        self.assertEqual(
+            self.sheet.resize.call_args_list,
+            [call(cols=2), call(rows=1000000)],
+        )
 
 
 class TestWorksheetWrites(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # parsed once; each test writes (and may modify) its own copy
+        cls.df = get_as_dataframe(MockWorksheet(), na_filter=False)
+
     def setUp(self):
         self.sheet = MockWorksheet()
         self.sheet.resize = MagicMock()
-        self.sheet.update_cells = MagicMock()
         self.sheet.spreadsheet.values_update = MagicMock()
 
     def test_write_basic(self):
-        df = get_as_dataframe(self.sheet, na_filter=False)
+        df = self.df.copy()
         set_with_dataframe(
             self.sheet,
             df,
@@ -285,12 +401,14 @@ class TestWorksheetWrites(unittest.TestCase):
             string_escaping=re.compile(r"3e50").match,
         )
         self.sheet.resize.assert_called_once_with(11, 11)
-        self.sheet.update_cells.assert_called_once_with(
-            CELL_LIST_STRINGIFIED, value_input_option="USER_ENTERED"
+        self.sheet.spreadsheet.values_update.assert_called_once_with(
+            "'gspread dataframe test'!A1:K11",
+            params={"valueInputOption": "USER_ENTERED"},
+            body={"values": VALUES_STRINGIFIED},
         )
 
     def test_include_index_false(self):
-        df = get_as_dataframe(self.sheet, na_filter=False)
+        df = self.df.copy()
         df_index = df.set_index("Thingy")
         set_with_dataframe(
             self.sheet,
@@ -300,12 +418,14 @@ class TestWorksheetWrites(unittest.TestCase):
             string_escaping=lambda x: x == "3e50",
         )
         self.sheet.resize.assert_called_once_with(11, 10)
-        self.sheet.update_cells.assert_called_once_with(
-            CELL_LIST_STRINGIFIED_NO_THINGY, value_input_option="USER_ENTERED"
+        self.sheet.spreadsheet.values_update.assert_called_once_with(
+            "'gspread dataframe test'!A1:J11",
+            params={"valueInputOption": "USER_ENTERED"},
+            body={"values": VALUES_STRINGIFIED_NO_THINGY},
         )
 
     def test_include_index_true(self):
-        df = get_as_dataframe(self.sheet, na_filter=False)
+        df = self.df.copy()
         df_index = df.set_index("Thingy")
         set_with_dataframe(
             self.sheet,
@@ -315,12 +435,14 @@ class TestWorksheetWrites(unittest.TestCase):
             string_escaping=re.compile(r"3e50").match,
         )
         self.sheet.resize.assert_called_once_with(11, 11)
-        self.sheet.update_cells.assert_called_once_with(
-            CELL_LIST_STRINGIFIED, value_input_option="USER_ENTERED"
+        self.sheet.spreadsheet.values_update.assert_called_once_with(
+            "'gspread dataframe test'!A1:K11",
+            params={"valueInputOption": "USER_ENTERED"},
+            body={"values": VALUES_STRINGIFIED},
         )
 
     def test_write_list_value_to_cell(self):
-        df = get_as_dataframe(self.sheet, na_filter=False)
+        df = self.df.copy()
         df.at[0, "Numeric Column"] = [1, 2, 3]
         set_with_dataframe(
             self.sheet,
@@ -329,6 +451,55 @@ class TestWorksheetWrites(unittest.TestCase):
             string_escaping=re.compile(r"3e50").match,
         )
         self.sheet.resize.assert_called_once_with(11, 11)
-        self.sheet.update_cells.assert_called_once_with(
-            CELL_LIST_STRINGIFIED, value_input_option="USER_ENTERED"
+        self.sheet.spreadsheet.values_update.assert_called_once_with(
+            "'gspread dataframe test'!A1:K11",
+            params={"valueInputOption": "USER_ENTERED"},
+            body={"values": VALUES_STRINGIFIED},
         )
+
+    def test_write_in_batches(self):
+        df = self.df.copy()
+        with patch("gspread_dataframe.GOOGLE_SHEET_UPDATE_BYTES_LIMIT", 1):
+            set_with_dataframe(
+                self.sheet,
+                df,
+                resize=True,
+                string_escaping=re.compile(r"3e50").match,
+            )
+        # every row is over the limit, so each batch holds a single row
+        calls = self.sheet.spreadsheet.values_update.call_args_list
+        self.assertEqual(
+            [c[0][0] for c in calls],
+            ["'gspread dataframe test'!A%d:K%d" % (n, n) for n in range(1, 12)],
+        )
+        sent = [row for c in calls for row in c[1]["body"]["values"]]
+        self.assertEqual(sent, VALUES_STRINGIFIED)
+
+    def test_write_in_batches_by_size(self):
+        df = pd.DataFrame({"a": ["x" * 100] * 5})
+        with patch("gspread_dataframe.GOOGLE_SHEET_UPDATE_BYTES_LIMIT", 250):
+            set_with_dataframe(self.sheet, df)
+        # each row is about 100 bytes of JSON, so a batch holds two rows
+        self.assertEqual(
+            [c[0][0] for c in self.sheet.spreadsheet.values_update.call_args_list],
+            [
+                "'gspread dataframe test'!A1:A2",
+                "'gspread dataframe test'!A3:A4",
+                "'gspread dataframe test'!A5:A6",
+            ],
+        )
+
+    def test_write_in_batches_stops_at_failure(self):
+        df = pd.DataFrame({"a": ["x" * 100] * 5})
+        self.sheet.spreadsheet.values_update.side_effect = [{}, ValueError("boom")]
+        with patch("gspread_dataframe.GOOGLE_SHEET_UPDATE_BYTES_LIMIT", 250):
+            with self.assertRaises(ValueError):
+                set_with_dataframe(self.sheet, df)
+        self.assertEqual(self.sheet.spreadsheet.values_update.call_count, 2)
+
+    def test_invalid_string_escaping(self):
+        df = self.df.copy()
+        with self.assertRaises(ValueError):
+            set_with_dataframe(self.sheet, df, string_escaping="bogus")
+        self.sheet.resize.assert_not_called()
+        self.sheet.spreadsheet.values_update.assert_not_called()
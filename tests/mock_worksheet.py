@@ -1,7 +1,6 @@
 import os.path
 import json
 import re
-from gspread import Cell
 from gspread_dataframe import _cellrepr
 
 
@@ -12,43 +11,21 @@ def contents_of_file(filename, et_parse=True):
 
 SHEET_CONTENTS_FORMULAS = contents_of_file("sheet_contents_formulas.json")
 SHEET_CONTENTS_EVALUATED = contents_of_file("sheet_contents_evaluated.json")
-CELL_LIST = [
-    Cell(row=i + 1, col=j + 1, value=value)
-    for i, row in enumerate(contents_of_file("cell_list.json"))
-    for j, value in enumerate(row)
-]
+CELL_LIST_ROWS = contents_of_file("cell_list.json")
 
-CELL_LIST_STRINGIFIED = [
-    Cell(
-        row=i + 1,
-        col=j + 1,
-        value=_cellrepr(
+VALUES_STRINGIFIED = [
+    [
+        _cellrepr(
             value,
             allow_formulas=True,
             string_escaping=re.compile(r"3e50").match,
-        ),
-    )
-    for i, row in enumerate(contents_of_file("cell_list.json"))
-    for j, value in enumerate(row)
+        )
+        for value in row
+    ]
+    for row in CELL_LIST_ROWS
 ]
 
-_without_index = contents_of_file("cell_list.json")
-for _r in _without_index:
-    del _r[0]
-
-CELL_LIST_STRINGIFIED_NO_THINGY = [
-    Cell(
-        row=i + 1,
-        col=j + 1,
-        value=_cellrepr(
-            value,
-            allow_formulas=True,
-            string_escaping=re.compile(r"3e50").match,
-        ),
-    )
-    for i, row in enumerate(_without_index)
-    for j, value in enumerate(row)
-]
+VALUES_STRINGIFIED_NO_THINGY = [row[1:] for row in VALUES_STRINGIFIED]
 
 
 class MockWorksheet(object):
@@ -60,15 +37,18 @@ class MockWorksheet(object):
         self.spreadsheet = MockSpreadsheet()
 
 
+SHEET_CONTENTS_BY_RENDER_OPTION = {
+    "UNFORMATTED_VALUE": SHEET_CONTENTS_EVALUATED,
+    "FORMULA": SHEET_CONTENTS_FORMULAS,
+}
+
+
 class MockSpreadsheet(object):
     def values_get(self, *args, **kwargs):
-        if (
-            kwargs.get("params", {}).get("valueRenderOption")
-            == "UNFORMATTED_VALUE"
-        ):
-            return SHEET_CONTENTS_EVALUATED
-        if kwargs.get("params", {}).get("valueRenderOption") == "FORMULA":
-            return SHEET_CONTENTS_FORMULAS
+        params = kwargs.get("params")
+        if params is None:
+            return None
+        return SHEET_CONTENTS_BY_RENDER_OPTION.get(params.get("valueRenderOption"))
 
 
 if __name__ == "__main__":